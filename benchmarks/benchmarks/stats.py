@@ -738,3 +738,20 @@ class RandomTable(Benchmark):
 
     def time_method(self, method, ntot, ncell):
         self.dist.rvs(1000, method=method, random_state=self.rng)
+
+
+class ContingencyTable(Benchmark):
+    param_names = ["shape"]
+    params = [
+        [(300, 300), (40, 40, 40, 40), (20, 20, 20, 20, 20)]
+    ]
+
+    def setup(self, shape):
+        rng = np.random.default_rng(12345678)
+        self.observed = rng.integers(1, 100, size=shape)
+
+    def time_expected_freq(self, shape):
+        stats.contingency.expected_freq(self.observed)
+
+    def time_chi2_contingency(self, shape):
+        stats.chi2_contingency(self.observed)
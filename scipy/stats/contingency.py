@@ -21,9 +21,12 @@ Functions for creating and analyzing contingency tables.
 """
 
 
-from functools import reduce
+from concurrent.futures import ThreadPoolExecutor
+import contextlib
 import math
 import numpy as np
+from . import distributions
+from ._qmc import _validate_workers
 from ._stats_py import power_divergence
 from ._relative_risk import relative_risk
 from ._crosstab import crosstab
@@ -35,13 +38,74 @@ __all__ = ['margins', 'expected_freq', 'chi2_contingency', 'crosstab',
            'association', 'relative_risk', 'odds_ratio']
 
 
-def margins(a):
+# With more than one worker, tables are split into blocks of about
+# `_PARALLEL_BLOCK_NBYTES` contiguous bytes that are reduced concurrently.
+# The block size is fixed (rather than derived from the number of workers),
+# so for any ``workers > 1`` the results are the same whatever the number of
+# workers or the machine.  They may differ in the last bits from the
+# unblocked reductions done with ``workers=1``.
+_PARALLEL_BLOCK_NBYTES = 2 * 1024 * 1024
+
+# Size of the blocks of expected frequencies formed at a time by
+# `_pearson_chi2_2d_streamed`; small enough for a block to stay in cache.
+_CHI2_BLOCK_NBYTES = 256 * 1024
+
+
+@contextlib.contextmanager
+def _thread_pool(workers):
+    # A pool of `workers` threads, shared by all the reductions of one call
+    # to a public function, or None if there is a single worker.
+    workers = _validate_workers(workers)
+    if workers == 1:
+        yield None
+    else:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            yield pool
+
+
+def _map_row_blocks(func, arrays, pool=None):
+    # Apply `func` to corresponding blocks of rows of `arrays` (which share
+    # their first dimension), using the thread pool `pool`.  NumPy releases
+    # the GIL in its inner loops, so the blocks are processed in parallel.
+    # Returns None if there is no pool or the arrays fit in a single block.
+    if pool is None:
+        return None
+    nbytes = sum(arr.nbytes for arr in arrays)
+    n_rows = arrays[0].shape[0]
+    step = max(1, _PARALLEL_BLOCK_NBYTES * n_rows // max(1, nbytes))
+    if step >= n_rows:
+        return None
+    blocks = [slice(i, i + step) for i in range(0, n_rows, step)]
+    return list(pool.map(lambda b: func(*[arr[b] for arr in arrays]),
+                         blocks))
+
+
+def _parallel_reduce(arr, axis, pool=None, dtype=None):
+    # Equivalent to `arr.sum(axis=axis, dtype=dtype)` for a 2-D `arr`, but
+    # given a thread pool, large arrays are split into contiguous blocks of
+    # rows that are summed in separate threads before the partial results
+    # are combined.
+    partials = _map_row_blocks(lambda a: a.sum(axis=axis, dtype=dtype),
+                               (arr,), pool=pool)
+    if partials is None:
+        return arr.sum(axis=axis, dtype=dtype)
+    if axis == 1:
+        return np.concatenate(partials)
+    return np.sum(partials, axis=0)
+
+
+def margins(a, dtype=None):
     """Return a list of the marginal sums of the array `a`.
 
     Parameters
     ----------
     a : ndarray
         The array for which to compute the marginal sums.
+    dtype : data-type, optional
+        The type of the accumulator and of the returned marginal sums.  By
+        default, the dtype of `a` is used, as in `numpy.sum`.
+
+        .. versionadded:: 1.11.0
 
     Returns
     -------
@@ -79,15 +143,15 @@ def margins(a):
     >>> m2
     array([[[60, 66, 72, 78]]])
     """
-    margsums = []
-    ranged = list(range(a.ndim))
-    for k in ranged:
-        marg = np.apply_over_axes(np.sum, a, [j for j in ranged if j != k])
-        margsums.append(marg)
+    # A single multi-axis reduction per margin; `keepdims` gives the same
+    # shape `apply_over_axes` would, without its per-axis passes.
+    axes = tuple(range(a.ndim))
+    margsums = [a.sum(axis=axes[:k] + axes[k+1:], keepdims=True, dtype=dtype)
+                for k in axes]
     return margsums
 
 
-def expected_freq(observed):
+def expected_freq(observed, *, workers=1):
     """
     Compute the expected frequencies from a contingency table.
 
@@ -102,6 +166,11 @@ def expected_freq(observed):
         The table of observed frequencies.  (While this function can handle
         a 1-D array, that case is trivial.  Generally `observed` is at
         least 2-D.)
+    workers : int, optional
+        Number of threads used to reduce large two-dimensional tables in
+        parallel.  If -1 is given all CPU threads are used.  Default is 1.
+
+        .. versionadded:: 1.11.0
 
     Returns
     -------
@@ -119,29 +188,171 @@ def expected_freq(observed):
            [ 18.,  18.,  24.]])
 
     """
-    # Typically `observed` is an integer array. If `observed` has a large
-    # number of dimensions or holds large values, some of the following
-    # computations may overflow, so we first switch to floating point.
-    observed = np.asarray(observed, dtype=np.float64)
-
-    # Create a list of the marginal sums.
-    margsums = margins(observed)
+    observed = np.asarray(observed)
+    with _thread_pool(workers) as pool:
+        return _expected_freq_and_total(observed, pool=pool)[0]
+
+
+def _expected_freq_and_total(observed, pool=None):
+    # Compute the expected frequencies of the ndarray `observed`, and also
+    # return the grand total (a float64 scalar) used to build them, so that
+    # callers don't need to recompute it.
+    if observed.ndim == 2:
+        # Fast path for the common R x C table: the expected table is the
+        # outer product of the row and column sums.
+        row, col, total = _margins_2d(observed, pool=pool)
+        return _expected_2d(row, col, total), total
+
+    # Create a list of the marginal sums.  Typically `observed` is an
+    # integer array. If `observed` has a large number of dimensions or holds
+    # large values, some of the following computations may overflow, so the
+    # sums are accumulated in floating point.  Passing the dtype to the
+    # reduction avoids making a float64 copy of the whole table.
+    margsums = margins(observed, dtype=np.float64)
+
+    # Every marginal sums to the grand total, so take it from the smallest
+    # one rather than making another pass over `observed`.
+    total = margsums[int(np.argmin([m.size for m in margsums]))].sum()
 
     # Create the array of expected frequencies.  The shapes of the
-    # marginal sums returned by apply_over_axes() are just what we
-    # need for broadcasting in the following product.
+    # marginal sums returned by margins() are just what we
+    # need for broadcasting in the following product.  It is accumulated in
+    # a single preallocated array, and the normalization is done in place,
+    # so `expected` is the only full-size array allocated.
     d = observed.ndim
-    expected = reduce(np.multiply, margsums) / observed.sum() ** (d - 1)
+    if d == 1:
+        # `margins` returns a new array, which can be used directly.
+        expected = margsums[0]
+    else:
+        expected = np.empty(observed.shape, dtype=np.float64)
+        np.multiply(margsums[0], margsums[1], out=expected)
+        for m in margsums[2:]:
+            np.multiply(expected, m, out=expected)
+    expected /= total ** (d - 1)
+    return expected, total
+
+
+def _margins_2d(observed, pool=None):
+    # The row sums, column sums and grand total (as float64) of the 2-D
+    # table `observed`, computed with two contiguous reductions.
+    if (np.issubdtype(observed.dtype, np.integer)
+            and observed.size < 2**(63 - 8*observed.dtype.itemsize)):
+        # The sums of an integer table this small cannot overflow int64,
+        # so they are computed exactly without converting the whole
+        # table to floating point.
+        dtype = np.int64
+    else:
+        dtype = np.float64
+    row = _parallel_reduce(observed, 1, pool=pool, dtype=dtype)
+    col = _parallel_reduce(observed, 0, pool=pool, dtype=dtype)
+    return row, col, np.float64(row.sum())
+
+
+def _expected_2d(row, col, total):
+    # Expected frequencies of a 2-D table, or of each table of a stack of
+    # 2-D tables along the last two axes, from the row sums `row` (shape
+    # (..., R)), the column sums `col` (shape (..., C)) and the grand totals
+    # `total` (shape (...)).
+    expected = np.multiply(row[..., :, np.newaxis], col[..., np.newaxis, :],
+                           dtype=np.float64)
+    expected /= np.asarray(total)[..., np.newaxis, np.newaxis]
     return expected
 
 
+def _yates_correction(observed, expected):
+    # Adjust `observed` according to Yates' correction for continuity.
+    # Magnitude of correction no bigger than difference; see gh-13875
+    return observed + np.clip(expected - observed, -0.5, 0.5)
+
+
+def _check_observed(observed):
+    # `min()` fuses the comparison with the reduction, so these checks
+    # don't allocate a boolean mask the size of the table.  `fmin` ignores
+    # NaNs (without warning, unlike `nanmin`) so that they don't hide
+    # negative values.
+    if np.issubdtype(observed.dtype, np.inexact):
+        min_ = np.fmin.reduce
+    else:
+        min_ = np.min
+    if observed.size and min_(observed, axis=None) < 0:
+        raise ValueError("All values in `observed` must be nonnegative.")
+    if observed.size == 0:
+        raise ValueError("No data; `observed` has size 0.")
+
+
+def _raise_zero_expected(zeropos):
+    # `zeropos` is the index of a zero in the table of expected frequencies.
+    raise ValueError("The internally computed table of expected "
+                     "frequencies has a zero element at %s."
+                     % (tuple(int(k) for k in zeropos),))
+
+
+def _check_expected(expected):
+    if expected.min() == 0:
+        # Include one of the positions where expected is zero in
+        # the exception message.  The expected frequencies are nonnegative,
+        # so the first minimum is the first zero.
+        _raise_zero_expected(np.unravel_index(np.argmin(expected),
+                                              expected.shape))
+
+
+def _check_margins_2d(row, col, total):
+    # Equivalent to `_check_expected(np.outer(row, col) / total)`, without
+    # forming the outer product.  If `total` is 0, the expected frequencies
+    # are all nan, which `_check_expected` doesn't reject either.
+    i, j = int(np.argmin(row)), int(np.argmin(col))
+    if total and (row[i] == 0 or col[j] == 0):
+        # Report the first zero in C order, as `_check_expected` does.
+        if col[j] == 0:
+            _raise_zero_expected((0, 0 if row[0] == 0 else j))
+        _raise_zero_expected((i, 0))
+
+
+def _pearson_chi2_2d(observed, expected, pool=None):
+    # Pearson's chi-squared statistic of a 2-D table, sum((O - E)**2 / E),
+    # or of each table of a stack of 2-D tables along the last two axes,
+    # accumulated in a single einsum pass.  A 2-D table is processed per
+    # block of rows if a thread pool is given.
+    if observed.ndim == 2:
+        partials = _map_row_blocks(_pearson_chi2_2d, (observed, expected),
+                                   pool=pool)
+        if partials is not None:
+            return np.sum(partials)
+    diff = observed - expected
+    return np.einsum('...ij,...ij->...', diff, diff / expected)
+
+
+def _pearson_chi2_2d_streamed(observed, row, col, total, pool=None,
+                              block_nbytes=_CHI2_BLOCK_NBYTES):
+    # As `_pearson_chi2_2d`, but the expected frequencies are formed from
+    # the row sums `row`, column sums `col` and grand total `total` about
+    # `block_nbytes` bytes at a time, so the full expected table is never
+    # materialized.
+    col = col.astype(np.float64)
+    step = max(1, block_nbytes // (8 * max(1, col.size)))
+
+    def rows_chi2(obs_rows, row_sums):
+        stat = 0.0
+        for i in range(0, obs_rows.shape[0], step):
+            exp_rows = np.multiply.outer(row_sums[i:i+step], col)
+            exp_rows /= total
+            stat += _pearson_chi2_2d(obs_rows[i:i+step], exp_rows)
+        return stat
+
+    partials = _map_row_blocks(rows_chi2, (observed, row), pool=pool)
+    if partials is not None:
+        return np.sum(partials)
+    return rows_chi2(observed, row)
+
+
 Chi2ContingencyResult = _make_tuple_bunch(
     'Chi2ContingencyResult',
     ['statistic', 'pvalue', 'dof', 'expected_freq'], []
 )
 
 
-def chi2_contingency(observed, correction=True, lambda_=None):
+def chi2_contingency(observed, correction=True, lambda_=None, *, axes=None,
+                     workers=1):
     """Chi-square test of independence of variables in a contingency table.
 
     This function computes the chi-square statistic and p-value for the
@@ -169,16 +380,31 @@ def chi2_contingency(observed, correction=True, lambda_=None):
         chi-squared statistic [2]_.  `lambda_` allows a statistic from the
         Cressie-Read power divergence family [3]_ to be used instead.  See
         `scipy.stats.power_divergence` for details.
+    axes : tuple of two ints, optional
+        If given, `observed` is treated as a stack of two-dimensional
+        contingency tables whose rows and columns lie along ``axes[0]`` and
+        ``axes[1]``, respectively; the remaining axes index the tables.  The
+        test is performed independently on each table.  By default, all of
+        `observed` is a single (possibly multi-dimensional) table.
+
+        .. versionadded:: 1.11.0
+    workers : int, optional
+        Number of threads used to reduce large two-dimensional tables in
+        parallel; not used if `axes` is given.  If -1 is given all CPU
+        threads are used.  Default is 1.
+
+        .. versionadded:: 1.11.0
 
     Returns
     -------
     res : Chi2ContingencyResult
         An object containing attributes:
 
-        statistic : float
-            The test statistic.
-        pvalue : float
-            The p-value of the test.
+        statistic : float or ndarray
+            The test statistic.  If `axes` is given, an array with the shape
+            of `observed` without `axes`.
+        pvalue : float or ndarray
+            The p-value of the test, with the same shape as `statistic`.
         dof : int
             The degrees of freedom.
         expected_freq : ndarray, same shape as `observed`
@@ -325,47 +551,131 @@ def chi2_contingency(observed, correction=True, lambda_=None):
     8.7584514426741897
     >>> res.pvalue
     0.64417725029295503
+
+    A stack of tables, such as those generated by resampling, can be tested
+    in a single call with the `axes` argument.  Here the tables are indexed
+    by the first axis:
+
+    >>> tables = np.array([[[10, 10, 20], [20, 20, 20]],
+    ...                    [[15, 5, 20], [20, 20, 20]]])
+    >>> res = chi2_contingency(tables, axes=(1, 2))
+    >>> res.statistic
+    array([2.77777778, 5.95238095])
+    >>> res.dof
+    2
     """
+    if axes is not None:
+        if workers != 1:
+            raise ValueError("`workers` is not supported together with "
+                             "`axes`.")
+        return _chi2_contingency_batched(observed, correction=correction,
+                                         lambda_=lambda_, axes=axes)
+    with _thread_pool(workers) as pool:
+        res, _ = _chi2_contingency_full(observed, correction=correction,
+                                        lambda_=lambda_, pool=pool)
+    return res
+
+
+def _chi2_contingency_batched(observed, correction, lambda_, axes):
+    # `chi2_contingency` of a stack of 2-D tables, with rows and columns
+    # along `axes`.  Everything is computed with whole-array operations on
+    # the stack, so there is no per-table Python overhead.
+    if len(axes) != 2:
+        raise ValueError("`axes` must be a tuple of two ints.")
     observed = np.asarray(observed)
-    if np.any(observed < 0):
-        raise ValueError("All values in `observed` must be nonnegative.")
-    if observed.size == 0:
-        raise ValueError("No data; `observed` has size 0.")
+    _check_observed(observed)
+
+    # Work with the rows and columns of each table as the last two axes.
+    observed = np.moveaxis(observed, axes, (-2, -1))
+    n_rows, n_cols = observed.shape[-2:]
+    dof = (n_rows - 1) * (n_cols - 1)
+
+    row = observed.sum(axis=-1, dtype=np.float64)
+    col = observed.sum(axis=-2, dtype=np.float64)
+    total = row.sum(axis=-1)
+    with np.errstate(invalid='ignore'):
+        # An all-zero table in the stack has nan expected frequencies, as
+        # it does on its own; it need not warn about the others.
+        expected = _expected_2d(row, col, total)
+    expected_out = np.moveaxis(expected, (-2, -1), axes)
+    # Unlike `_check_expected`, don't rely on `min()`: the expected
+    # frequencies of an all-zero table in the stack are nan, which would
+    # hide zeros in the other tables.
+    is_zero = expected_out == 0
+    if is_zero.any():
+        _raise_zero_expected(np.unravel_index(np.argmax(is_zero),
+                                              is_zero.shape))
 
-    expected = expected_freq(observed)
-    if np.any(expected == 0):
-        # Include one of the positions where expected is zero in
-        # the exception message.
-        zeropos = list(zip(*np.nonzero(expected == 0)))[0]
-        raise ValueError("The internally computed table of expected "
-                         "frequencies has a zero element at %s." % (zeropos,))
+    if dof == 0:
+        # Degenerate case, as in `_chi2_contingency_full`.
+        chi2 = np.zeros(observed.shape[:-2])[()]
+        p = np.ones(observed.shape[:-2])[()]
+    else:
+        if dof == 1 and correction:
+            observed = _yates_correction(observed, expected)
+
+        if lambda_ is None:
+            chi2 = _pearson_chi2_2d(observed, expected)
+            p = distributions.chi2.sf(chi2, dof)
+        else:
+            shape = observed.shape[:-2] + (-1,)
+            chi2, p = power_divergence(observed.reshape(shape),
+                                       expected.reshape(shape),
+                                       ddof=n_rows*n_cols - 1 - dof,
+                                       axis=-1, lambda_=lambda_)
+
+    return Chi2ContingencyResult(chi2, p, dof, expected_out)
+
+
+def _chi2_contingency_full(observed, correction=True, lambda_=None,
+                           pool=None):
+    # Implementation of `chi2_contingency`.  Also returns the grand total of
+    # `observed` so that callers such as `association` need not recompute
+    # it.
+    observed = np.asarray(observed)
+    _check_observed(observed)
 
-    # The degrees of freedom
-    dof = expected.size - sum(expected.shape) + expected.ndim - 1
+    # The degrees of freedom.  `expected` has the same shape as `observed`,
+    # so this can be found before computing the expected frequencies.
+    dof = observed.size - sum(observed.shape) + observed.ndim - 1
 
     if dof == 0:
         # Degenerate case; this occurs when `observed` is 1D (or, more
         # generally, when it has only one nontrivial dimension).  In this
-        # case, we also have observed == expected, so chi2 is 0.
+        # case, we also have observed == expected, so chi2 is 0 and the
+        # marginal sums need not be computed at all.
+        expected = observed.astype(np.float64, copy=True)
+        total = expected.sum()
+        if total == 0 and observed.ndim > 1:
+            # `expected_freq` divides the product of the marginal sums by
+            # total**(ndim - 1), so an all-zero table gives nan.
+            expected.fill(np.nan)
+        _check_expected(expected)
         chi2 = 0.0
         p = 1.0
     else:
+        expected, total = _expected_freq_and_total(observed, pool=pool)
+        _check_expected(expected)
+
         if dof == 1 and correction:
-            # Adjust `observed` according to Yates' correction for continuity.
-            # Magnitude of correction no bigger than difference; see gh-13875
-            diff = expected - observed
-            direction = np.sign(diff)
-            magnitude = np.minimum(0.5, np.abs(diff))
-            observed = observed + magnitude * direction
+            observed = _yates_correction(observed, expected)
 
-        chi2, p = power_divergence(observed, expected,
-                                   ddof=observed.size - 1 - dof, axis=None,
-                                   lambda_=lambda_)
+        if observed.ndim == 2 and lambda_ is None:
+            # Pearson's statistic of an R x C table; skip the general
+            # `power_divergence` machinery, whose overhead dominates for
+            # the small tables this is typically called with.
+            chi2 = _pearson_chi2_2d(observed, expected, pool=pool)
+            p = distributions.chi2.sf(chi2, dof)
+        else:
+            chi2, p = power_divergence(observed, expected,
+                                       ddof=observed.size - 1 - dof,
+                                       axis=None, lambda_=lambda_)
 
-    return Chi2ContingencyResult(chi2, p, dof, expected)
+    return Chi2ContingencyResult(chi2, p, dof, expected), total
 
 
-def association(observed, method="cramer", correction=False, lambda_=None):
+def association(observed, method="cramer", correction=False, lambda_=None,
+                *, workers=1):
     """Calculates degree of association between two nominal variables.
 
     The function provides the option for computing one of three measures of
@@ -383,6 +693,11 @@ def association(observed, method="cramer", correction=False, lambda_=None):
         Inherited from `scipy.stats.contingency.chi2_contingency()`
     lambda_ : float or str, optional
         Inherited from `scipy.stats.contingency.chi2_contingency()`
+    workers : int, optional
+        Number of threads used to reduce large two-dimensional tables in
+        parallel.  If -1 is given all CPU threads are used.  Default is 1.
+
+        .. versionadded:: 1.11.0
 
     Returns
     -------
@@ -450,19 +765,36 @@ def association(observed, method="cramer", correction=False, lambda_=None):
     if len(arr.shape) != 2:
         raise ValueError("method only accepts 2d arrays")
 
-    chi2_stat = chi2_contingency(arr, correction=correction,
-                                 lambda_=lambda_)
+    with _thread_pool(workers) as pool:
+        if not correction and lambda_ is None:
+            # Pearson's chi-squared statistic without Yates' correction;
+            # compute it directly from the table rather than going through
+            # `chi2_contingency` and `power_divergence`.  The expected
+            # frequencies are not needed, so they are never stored in full.
+            _check_observed(arr)
+            row, col, total = _margins_2d(arr, pool=pool)
+            _check_margins_2d(row, col, total)
+            phi2 = _pearson_chi2_2d_streamed(arr, row, col, total,
+                                             pool=pool) / total
+        else:
+            chi2_stat, total = _chi2_contingency_full(arr,
+                                                      correction=correction,
+                                                      lambda_=lambda_,
+                                                      pool=pool)
+            phi2 = chi2_stat.statistic / total
 
-    phi2 = chi2_stat.statistic / arr.sum()
     n_rows, n_cols = arr.shape
+    # `phi2` is a NumPy scalar, so a degenerate table (e.g. a single row)
+    # gives nan with a warning here rather than raising ZeroDivisionError.
     if method == "cramer":
-        value = phi2 / min(n_cols - 1, n_rows - 1)
+        value = np.sqrt(phi2) / math.sqrt(min(n_cols - 1, n_rows - 1))
     elif method == "tschuprow":
-        value = phi2 / math.sqrt((n_rows - 1) * (n_cols - 1))
+        # sqrt(phi2 / sqrt(k)) == sqrt(phi2) / k**0.25
+        value = np.sqrt(phi2) / ((n_rows - 1) * (n_cols - 1))**0.25
     elif method == 'pearson':
-        value = phi2 / (1 + phi2)
+        value = np.sqrt(phi2 / (1 + phi2))
     else:
         raise ValueError("Invalid argument value: 'method' argument must "
                          "be 'cramer', 'tschuprow', or 'pearson'")
 
-    return math.sqrt(value)
+    return float(value)
@@ -1,3 +1,5 @@
+import warnings
+
 import numpy as np
 from numpy.testing import (assert_equal, assert_array_equal,
                            assert_array_almost_equal, assert_approx_equal,
@@ -5,6 +7,7 @@ from numpy.testing import (assert_equal, assert_array_equal,
 import pytest
 from pytest import raises as assert_raises
 from scipy.special import xlogy
+from scipy.stats import contingency
 from scipy.stats.contingency import (margins, expected_freq,
                                      chi2_contingency, association)
 
@@ -39,6 +42,11 @@ def test_margins():
     assert_array_equal(m1, expected1)
     assert_array_equal(m2, expected2)
 
+    m0, m1, m2 = margins(a.astype(np.int8), dtype=np.float64)
+    for m, e in [(m0, expected0), (m1, expected1), (m2, expected2)]:
+        assert_equal(m.dtype, np.float64)
+        assert_array_equal(m, e)
+
 
 def test_expected_freq():
     assert_array_equal(expected_freq([1]), np.array([1.0]))
@@ -52,6 +60,34 @@ def test_expected_freq():
     correct = np.array([[12., 12., 16.], [18., 18., 24.]])
     assert_array_almost_equal(e, correct)
 
+    # Narrow integer tables are summed in int64; the result is still float64.
+    for dtype in [np.uint8, np.int16, np.int32, np.int64, np.float32]:
+        e = expected_freq(observed.astype(dtype))
+        assert_equal(e.dtype, np.float64)
+        assert_array_almost_equal(e, correct)
+
+
+def test_workers():
+    # A table large enough to be split into several blocks of rows
+    rng = np.random.default_rng(2389563)
+    obs = rng.integers(1, 100, size=(3000, 200))
+    with contingency._thread_pool(4) as pool:
+        for axis in [0, 1, None]:
+            res = contingency._parallel_reduce(obs, axis, pool=pool)
+            assert_array_equal(res, obs.sum(axis=axis))
+
+    e = np.outer(obs.sum(axis=1), obs.sum(axis=0)) / obs.sum()
+    assert_allclose(expected_freq(obs, workers=4), e, rtol=1e-14)
+    res = chi2_contingency(obs, workers=-1)
+    assert_allclose(res.expected_freq, e, rtol=1e-14)
+    assert_allclose(res.statistic, ((obs - e)**2 / e).sum(), rtol=1e-13)
+    assert_allclose(association(obs, workers=4), association(obs),
+                    rtol=1e-13)
+
+    assert_raises(ValueError, expected_freq, obs, workers=0)
+    assert_raises(ValueError, chi2_contingency, obs, workers=-2)
+    assert_raises(ValueError, association, obs, workers=0)
+
 
 def test_chi2_contingency_trivial():
     # Some very simple tests for chi2_contingency.
@@ -73,6 +109,30 @@ def test_chi2_contingency_trivial():
     assert_array_equal(obs, expected)
 
 
+@pytest.mark.parametrize("shape", [(1, 3), (2, 1), (1, 1, 2)])
+def test_chi2_contingency_trivial_zeros(shape):
+    # An all-zero table with dof == 0 has nan expected frequencies, as
+    # computed by `expected_freq`, and isn't rejected.
+    obs = np.zeros(shape, dtype=int)
+    chi2, p, dof, expected = chi2_contingency(obs)
+    assert_equal(chi2, 0.0)
+    assert_equal(p, 1.0)
+    assert_equal(dof, 0)
+    assert_equal(expected.shape, shape)
+    assert np.isnan(expected).all()
+
+    # The same table in a stack gives the same result.
+    if len(shape) == 2:
+        res = chi2_contingency(np.zeros((2,) + shape), axes=(1, 2))
+        assert_equal(res.statistic, [0.0, 0.0])
+        assert_equal(res.pvalue, [1.0, 1.0])
+        assert_equal(res.dof, 0)
+        assert np.isnan(res.expected_freq).all()
+
+    # The zeros of a 1-D table are its expected frequencies.
+    assert_raises(ValueError, chi2_contingency, np.zeros(3))
+
+
 def test_chi2_contingency_R():
     # Some test cases that were computed independently, using R.
 
@@ -184,6 +244,19 @@ def test_chi2_contingency_g():
     assert_allclose(g, 2*xlogy(c, c/e).sum())
 
 
+@pytest.mark.parametrize("correction", [False, True])
+def test_chi2_contingency_2d_matches_power_divergence(correction):
+    # 2-D tables with Pearson's statistic bypass `power_divergence`; check
+    # that the result is unchanged.
+    for obs in [np.array([[15, 60], [15, 90]]),
+                np.array([[10, 12, 10], [12, 10, 30], [2, 7, 11]])]:
+        res = chi2_contingency(obs, correction=correction)
+        ref = chi2_contingency(obs, correction=correction, lambda_="pearson")
+        assert_allclose(res.statistic, ref.statistic, rtol=1e-13)
+        assert_allclose(res.pvalue, ref.pvalue, rtol=1e-13)
+        assert_equal(res.dof, ref.dof)
+
+
 def test_chi2_contingency_bad_args():
     # Test that "bad" inputs raise a ValueError.
 
@@ -191,6 +264,15 @@ def test_chi2_contingency_bad_args():
     obs = np.array([[-1, 10], [1, 2]])
     assert_raises(ValueError, chi2_contingency, obs)
 
+    # A nan doesn't hide a negative value.
+    obs = np.array([[-1, np.nan], [1, 2]])
+    assert_raises(ValueError, chi2_contingency, obs)
+
+    # ... and checking an all-nan table doesn't warn.
+    with warnings.catch_warnings():
+        warnings.filterwarnings("error", "All-NaN", RuntimeWarning)
+        contingency._check_observed(np.full((2, 2), np.nan))
+
     # The zeros in this will result in zeros in the array
     # of expected frequencies.
     obs = np.array([[0, 1], [0, 1]])
@@ -209,6 +291,50 @@ def test_chi2_contingency_yates_gh13875():
     assert_allclose(p, 1, rtol=1e-12)
 
 
+@pytest.mark.parametrize("lambda_", [None, "log-likelihood"])
+@pytest.mark.parametrize("correction", [False, True])
+@pytest.mark.parametrize("shape", [(2, 2), (3, 4)])
+def test_chi2_contingency_axes(shape, correction, lambda_):
+    # A stack of tables gives the same results as testing each table
+    rng = np.random.default_rng(5923468)
+    obs = rng.integers(1, 20, size=(5,) + shape + (2,))
+    res = chi2_contingency(obs, correction=correction, lambda_=lambda_,
+                           axes=(1, 2))
+    assert_equal(res.statistic.shape, (5, 2))
+    assert_equal(res.pvalue.shape, (5, 2))
+    assert_equal(res.expected_freq.shape, obs.shape)
+    for i in range(5):
+        for j in range(2):
+            ref = chi2_contingency(obs[i, ..., j], correction=correction,
+                                   lambda_=lambda_)
+            assert_allclose(res.statistic[i, j], ref.statistic, rtol=1e-13)
+            assert_allclose(res.pvalue[i, j], ref.pvalue, rtol=1e-12)
+            assert_equal(res.dof, ref.dof)
+            assert_allclose(res.expected_freq[i, ..., j], ref.expected_freq,
+                            rtol=1e-14)
+
+    # Row and column axes may be given in either order.
+    res_t = chi2_contingency(obs, correction=correction, lambda_=lambda_,
+                             axes=(2, -3))
+    assert_allclose(res_t.statistic, res.statistic, rtol=1e-13)
+
+
+def test_chi2_contingency_axes_bad_args():
+    obs = np.ones((3, 2, 2))
+    assert_raises(ValueError, chi2_contingency, obs, axes=(0,))
+    assert_raises(ValueError, chi2_contingency, obs, axes=(1, 1))
+    assert_raises(np.AxisError, chi2_contingency, obs, axes=(1, 3))
+    assert_raises(ValueError, chi2_contingency, obs, axes=(1, 2), workers=2)
+    obs[1, 0] = 0
+    assert_raises(ValueError, chi2_contingency, obs, axes=(1, 2))
+
+    # An all-zero table (with nan expected frequencies) doesn't hide a zero
+    # expected frequency in another table of the stack.
+    obs = np.array([[[0, 0], [0, 0]], [[0, 0], [1, 2]]])
+    with pytest.raises(ValueError, match=r"zero element at \(1, 0, 0\)"):
+        chi2_contingency(obs, axes=(1, 2))
+
+
 @pytest.mark.parametrize("correction", [False, True])
 def test_result(correction):
     obs = np.array([[1, 2], [1, 2]])
@@ -239,3 +365,46 @@ def test_assoc(stat, expected):
                      [9, 15, 14, 12, 11]])
     a = association(observed=obs1, method=stat)
     assert_allclose(a, expected)
+
+
+@pytest.mark.parametrize('stat', ['cramer', 'tschuprow', 'pearson'])
+def test_assoc_matches_chi2_contingency(stat):
+    # The default (uncorrected Pearson) statistic is computed directly in
+    # `association`; check it against the `chi2_contingency` code path.
+    obs = np.array([[12, 13, 14, 15, 16],
+                    [17, 16, 18, 19, 11],
+                    [9, 15, 14, 12, 11]])
+    a = association(obs, method=stat)
+    b = association(obs, method=stat, lambda_="pearson")
+    assert_allclose(a, b, rtol=1e-13)
+
+    # A zero row still gives a zero expected frequency.
+    assert_raises(ValueError, association, [[0, 0], [1, 2]], stat)
+
+
+def test_assoc_streamed():
+    rng = np.random.default_rng(8239465)
+    obs = rng.integers(1, 50, size=(41, 6))
+    chi2 = chi2_contingency(obs, correction=False).statistic
+    res = association(obs, method="cramer")
+    assert_allclose(res, np.sqrt(chi2 / obs.sum() / 5), rtol=1e-13)
+
+    # Form the expected frequencies a few rows at a time
+    row, col, total = obs.sum(axis=1), obs.sum(axis=0), obs.sum()
+    res = contingency._pearson_chi2_2d_streamed(obs, row, col, total,
+                                                block_nbytes=100)
+    assert_allclose(res, chi2, rtol=1e-13)
+
+    # Zero expected frequencies are reported at the same position as by
+    # `chi2_contingency`.
+    for i, j in [(0, 3), (7, None), (None, 4), (7, 4), (0, None)]:
+        obs0 = obs.copy()
+        if i is not None:
+            obs0[i] = 0
+        if j is not None:
+            obs0[:, j] = 0
+        with pytest.raises(ValueError) as e1:
+            chi2_contingency(obs0)
+        with pytest.raises(ValueError) as e2:
+            association(obs0)
+        assert str(e1.value) == str(e2.value)